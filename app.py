@@ -1,19 +1,55 @@
 import os
+import sys
 import json
+import re
+import math
+import bisect
+import heapq
+import hashlib
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from functools import wraps
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from flask import Flask, Request, render_template, request, jsonify
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
 from openai import OpenAI
 from dotenv import load_dotenv
 import base64
+import binascii
 from io import BytesIO
 from PIL import Image
 import requests
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; cross-worker coalescing is simply skipped there
+    fcntl = None
+
 load_dotenv()
 
+# Upload limits
+# Bodies over MAX_REQUEST_BYTES are rejected from their Content-Length before
+# being read, and multipart files spill to a temporary file past UPLOAD_SPOOL_BYTES.
+MAX_REQUEST_BYTES = int(os.getenv('MAX_REQUEST_BYTES', str(25 * 1024 * 1024)))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv('MAX_IMAGE_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+MAX_FORM_FIELD_BYTES = int(os.getenv('MAX_FORM_FIELD_BYTES', str(10 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_BYTES', str(1024 * 1024)))
+
+class SpooledUploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, mode='rb+')
+
 app = Flask(__name__)
+app.request_class = SpooledUploadRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+app.config['MAX_FORM_MEMORY_SIZE'] = MAX_FORM_FIELD_BYTES
 
 # Initialize Firebase
 try:
@@ -50,39 +86,999 @@ except Exception as e:
 # Initialize OpenAI
 client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
-# Simple in-memory store for thumbnails (temporary solution)
-# This will be replaced with proper Firestore storage
-thumbnail_store = {}
+# Request coalescing for the generation routes
+# Identical requests that arrive while one is already running share its result
+# instead of starting another paid OpenAI call. Set SINGLEFLIGHT_LOCK_DIR to a
+# local directory to also coalesce across gunicorn workers on the same host.
+SINGLEFLIGHT_LOCK_DIR = os.getenv('SINGLEFLIGHT_LOCK_DIR')
+SINGLEFLIGHT_RESULT_TTL = int(os.getenv('SINGLEFLIGHT_RESULT_TTL', '60'))
+
+_inflight_calls = {}
+_inflight_lock = threading.Lock()
+
+class _InflightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def _normalise_payload(value):
+    """Collapse runs of whitespace so trivially different inputs share a key"""
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalise_payload(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalise_payload(v) for v in value]
+    return value
+
+def _coalesce_key(payload):
+    canonical = json.dumps(
+        {'path': request.path, 'payload': _normalise_payload(payload)},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _sweep_single_flight_dir():
+    """Remove shared results and wait markers older than their grace period"""
+    cutoff = time.time() - SINGLEFLIGHT_RESULT_TTL
+    for entry in os.scandir(SINGLEFLIGHT_LOCK_DIR):
+        if entry.name.endswith(('.json', '.wait', '.tmp')):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+def _release_lock_file(lock_file, lock_path):
+    """Unlink the lock file while still holding it, unless another worker already replaced it"""
+    try:
+        if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _run_across_workers(key, fn):
+    """Hold a per-key file lock so only one worker calls upstream at a time.
+
+    Workers that have to wait leave a marker; the holder writes a successful
+    result to disk only when it sees one, and waiters reuse it if it was written
+    after their wait started. Results are swept after SINGLEFLIGHT_RESULT_TTL.
+    """
+    if not SINGLEFLIGHT_LOCK_DIR or fcntl is None:
+        return fn()
+
+    os.makedirs(SINGLEFLIGHT_LOCK_DIR, exist_ok=True)
+    lock_path = os.path.join(SINGLEFLIGHT_LOCK_DIR, f'{key}.lock')
+    result_path = os.path.join(SINGLEFLIGHT_LOCK_DIR, f'{key}.json')
+    started = time.time()
+
+    with open(lock_path, 'a+') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another worker is running this exact request; wait for it
+            marker_path = os.path.join(SINGLEFLIGHT_LOCK_DIR, f'{key}.{os.getpid()}-{threading.get_ident()}.wait')
+            open(marker_path, 'w').close()
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            finally:
+                os.remove(marker_path)
+            try:
+                if os.path.getmtime(result_path) >= started:
+                    with open(result_path) as f:
+                        cached = json.load(f)
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    return cached['body'].encode('utf-8'), cached['status'], cached['mimetype']
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Single-flight result unavailable, running request: {e}")
+
+        try:
+            result = fn()
+            body, status, mimetype = result
+            waiting = any(name.startswith(f'{key}.') and name.endswith('.wait')
+                          for name in os.listdir(SINGLEFLIGHT_LOCK_DIR))
+            # Errors are not shared; a waiting worker retries the call itself
+            if waiting and 200 <= status < 300:
+                tmp_path = f'{result_path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'body': body.decode('utf-8'), 'status': status, 'mimetype': mimetype}, f)
+                os.replace(tmp_path, result_path)
+            _sweep_single_flight_dir()
+            return result
+        finally:
+            _release_lock_file(lock_file, lock_path)
+
+def single_flight(key, fn):
+    """Run fn once per key; concurrent callers with the same key wait and share its result"""
+    with _inflight_lock:
+        call = _inflight_calls.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _InflightCall()
+            _inflight_calls[key] = call
+
+    if not is_leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _run_across_workers(key, fn)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_calls.pop(key, None)
+        call.done.set()
 
-def store_thumbnail_in_firestore(idea_id, thumbnail_data):
-    """Store thumbnail as a separate document to avoid size limits"""
+def coalesce_requests(view):
+    """Share one upstream call between identical in-flight requests to a generation route"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        payload = request.get_json(silent=True)
+        if payload is None:
+            return view(*args, **kwargs)
+
+        def run_view():
+            response = app.make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, response.mimetype
+
+        body, status, mimetype = single_flight(_coalesce_key(payload), run_view)
+        # Each waiter gets its own response object built from the shared result
+        return app.response_class(body, status=status, mimetype=mimetype)
+    return wrapper
+
+def acquire_host_lock(path, retry_interval):
+    """Block until this process holds an exclusive lock shared by every worker on the host.
+
+    Returns the open lock file, which has to stay referenced for as long as the
+    lock is held, or None if the lock file can't be created.
+    """
     try:
-        # Store thumbnail in a separate collection
-        thumbnail_doc = {
-            'idea_id': idea_id,
-            'data': thumbnail_data,
-            'created_at': firestore.SERVER_TIMESTAMP
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        lock_file = open(path, 'a+')
+    except OSError as e:
+        print(f"Cannot open lock file {path}: {e}")
+        return None
+    if fcntl is None:
+        # No flock on this platform; assume a single-process development server
+        return lock_file
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except BlockingIOError:
+            # Another worker holds it; take over if that worker exits
+            time.sleep(retry_interval)
+
+# Fallback store for thumbnails whose Firestore write failed
+# Memory holds a byte-budgeted LRU; every entry is also written to a local spill
+# directory so other workers on the host can serve it and a background thread
+# can keep retrying the durable write.
+THUMBNAIL_CACHE_BYTES = int(os.getenv('THUMBNAIL_CACHE_BYTES', str(64 * 1024 * 1024)))
+THUMBNAIL_SPILL_BYTES = int(os.getenv('THUMBNAIL_SPILL_BYTES', str(512 * 1024 * 1024)))
+THUMBNAIL_SPILL_DIR = os.getenv('THUMBNAIL_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'brodeo-thumbnails'))
+THUMBNAIL_RESYNC_INTERVAL = int(os.getenv('THUMBNAIL_RESYNC_INTERVAL', '300'))
+
+class ThumbnailFallbackStore:
+    """Dict-like LRU of thumbnail data URLs bounded by total size, backed by disk"""
+
+    def __init__(self, max_bytes, spill_dir, spill_max_bytes):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0, 'disk_hits': 0, 'misses': 0,
+            'evictions': 0, 'evicted_bytes': 0, 'spill_evictions': 0,
+            'spill_errors': 0, 'resynced': 0
         }
-        db.collection('thumbnails').document(idea_id).set(thumbnail_doc)
+        try:
+            os.makedirs(spill_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Thumbnail spill directory unavailable: {e}")
+            self.spill_dir = None
+
+    def _spill_path(self, idea_id):
+        # Firestore auto IDs are alphanumeric; anything else stays memory-only
+        if not self.spill_dir or not re.fullmatch(r'[A-Za-z0-9_-]+', idea_id):
+            return None
+        return os.path.join(self.spill_dir, f'{idea_id}.b64')
+
+    def _remember(self, idea_id, thumbnail_data):
+        """Insert into the memory LRU, evicting least recently used entries. Caller holds the lock."""
+        if idea_id in self._entries:
+            self._bytes -= len(self._entries.pop(idea_id))
+        if len(thumbnail_data) > self.max_bytes:
+            return
+        self._entries[idea_id] = thumbnail_data
+        self._bytes += len(thumbnail_data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.stats['evictions'] += 1
+            self.stats['evicted_bytes'] += len(evicted)
+
+    def _write_spill(self, idea_id, thumbnail_data):
+        path = self._spill_path(idea_id)
+        if not path:
+            return
+        try:
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(thumbnail_data)
+            os.replace(tmp_path, path)
+            self._trim_spill()
+        except OSError as e:
+            self._count('spill_errors')
+            print(f"Error spilling thumbnail to disk: {e}")
+
+    def _trim_spill(self):
+        """Drop the oldest spilled files once the directory exceeds its budget"""
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith('.b64'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.spill_max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._count('spill_evictions')
+            except OSError:
+                pass
+            total -= size
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def record_resync(self):
+        self._count('resynced')
+
+    def read_spilled(self, idea_id):
+        """Read a spilled entry straight from disk without touching the LRU or the hit counters"""
+        path = self._spill_path(idea_id)
+        if not path:
+            return None
+        try:
+            with open(path) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Error reading spilled thumbnail: {e}")
+            return None
+
+    def spilled_mtime(self, idea_id):
+        path = self._spill_path(idea_id)
+        try:
+            return os.path.getmtime(path) if path else None
+        except OSError:
+            return None
+
+    def __setitem__(self, idea_id, thumbnail_data):
+        with self._lock:
+            self._remember(idea_id, thumbnail_data)
+        self._write_spill(idea_id, thumbnail_data)
+
+    def get(self, idea_id, default=None):
+        with self._lock:
+            if idea_id in self._entries:
+                self._entries.move_to_end(idea_id)
+                self.stats['hits'] += 1
+                return self._entries[idea_id]
+
+        thumbnail_data = self.read_spilled(idea_id)
+        if thumbnail_data is not None:
+            with self._lock:
+                self.stats['disk_hits'] += 1
+                self._remember(idea_id, thumbnail_data)
+            return thumbnail_data
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return default
+
+    def pop(self, idea_id, default=None):
+        with self._lock:
+            thumbnail_data = self._entries.pop(idea_id, None)
+            if thumbnail_data is not None:
+                self._bytes -= len(thumbnail_data)
+        path = self._spill_path(idea_id)
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error removing spilled thumbnail: {e}")
+        return thumbnail_data if thumbnail_data is not None else default
+
+    def spilled_ids(self):
+        if not self.spill_dir:
+            return []
+        return [name[:-len('.b64')] for name in os.listdir(self.spill_dir) if name.endswith('.b64')]
+
+    def snapshot_stats(self):
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+thumbnail_store = ThumbnailFallbackStore(THUMBNAIL_CACHE_BYTES, THUMBNAIL_SPILL_DIR, THUMBNAIL_SPILL_BYTES)
+
+# Thumbnails are stored as content-addressed chunks so large images fit under
+# Firestore's 1 MiB document limit. thumbnails/<idea_id> holds a small manifest,
+# thumbnail_chunks/<hash>-<n> holds the pieces of the base64 string, and
+# thumbnail_chunksets/<hash> lists the ideas using those chunks. Chunk sets are
+# created, shared and released inside one transaction with the manifest, so a
+# manifest never points at chunks another save has deleted.
+THUMBNAIL_CHUNK_SIZE = 900_000
+# A commit is capped at 10 MiB; larger thumbnails stay in the fallback store
+THUMBNAIL_MAX_BYTES = 9_000_000
+
+def thumbnail_hash(thumbnail_data):
+    return hashlib.sha256(thumbnail_data.encode('utf-8')).hexdigest()
+
+def _thumbnail_chunk_refs(content_hash, chunk_count):
+    chunks = db.collection('thumbnail_chunks')
+    return [chunks.document(f'{content_hash}-{i}') for i in range(chunk_count)]
+
+def _release_chunkset(transaction, chunkset_ref, chunkset, idea_id):
+    """Drop idea_id from a chunk set, deleting its chunks once nothing uses them"""
+    chunkset_data = chunkset.to_dict()
+    refs = set(chunkset_data.get('refs', [])) - {idea_id}
+    if refs:
+        transaction.set(chunkset_ref, {**chunkset_data, 'refs': sorted(refs)})
+        return
+    for ref in _thumbnail_chunk_refs(chunkset_ref.id, chunkset_data.get('chunk_count', 0)):
+        transaction.delete(ref)
+    transaction.delete(chunkset_ref)
+
+@firestore.transactional
+def _commit_thumbnail(transaction, idea_id, content_hash, chunks, size, spilled_at=None):
+    """Point the idea's manifest at content_hash; returns False if it already did.
+
+    spilled_at marks a retry of a fallback copy, which must not replace a
+    thumbnail stored after that copy was spilled.
+    """
+    manifest_ref = db.collection('thumbnails').document(idea_id)
+    chunksets = db.collection('thumbnail_chunksets')
+    chunkset_ref = chunksets.document(content_hash)
+
+    # Transactions need every read before the first write
+    manifest = manifest_ref.get(transaction=transaction)
+    previous = manifest.to_dict() if manifest.exists else {}
+    chunkset = chunkset_ref.get(transaction=transaction)
+    refs = set(chunkset.to_dict().get('refs', [])) if chunkset.exists else set()
+    old_hash = previous.get('hash')
+    old_chunkset = None
+    if old_hash and old_hash != content_hash:
+        old_chunkset = chunksets.document(old_hash).get(transaction=transaction)
+
+    if old_hash == content_hash and idea_id in refs:
+        return False
+    if spilled_at is not None and previous.get('created_at') and previous['created_at'] > spilled_at:
+        return False
+
+    if not chunkset.exists:
+        for ref, chunk in zip(_thumbnail_chunk_refs(content_hash, len(chunks)), chunks):
+            transaction.set(ref, {'hash': content_hash, 'data': chunk})
+    transaction.set(chunkset_ref, {'chunk_count': len(chunks), 'refs': sorted(refs | {idea_id})})
+    transaction.set(manifest_ref, {
+        'idea_id': idea_id,
+        'hash': content_hash,
+        'chunk_count': len(chunks),
+        'size': size,
+        'created_at': firestore.SERVER_TIMESTAMP
+    })
+    if old_chunkset is not None and old_chunkset.exists:
+        _release_chunkset(transaction, old_chunkset.reference, old_chunkset, idea_id)
+    return True
+
+@firestore.transactional
+def _remove_thumbnail(transaction, idea_id):
+    manifest_ref = db.collection('thumbnails').document(idea_id)
+    manifest = manifest_ref.get(transaction=transaction)
+    if not manifest.exists:
+        return
+    old_hash = manifest.to_dict().get('hash')
+    chunkset = None
+    if old_hash:
+        chunkset = db.collection('thumbnail_chunksets').document(old_hash).get(transaction=transaction)
+    transaction.delete(manifest_ref)
+    if chunkset is not None and chunkset.exists:
+        _release_chunkset(transaction, chunkset.reference, chunkset, idea_id)
+
+def store_thumbnail_in_firestore(idea_id, thumbnail_data, spilled_at=None):
+    """Store thumbnail as chunked documents, skipping the write if it is unchanged"""
+    try:
+        if len(thumbnail_data) > THUMBNAIL_MAX_BYTES:
+            raise ValueError(f'thumbnail is {len(thumbnail_data)} bytes; the limit is {THUMBNAIL_MAX_BYTES}')
+        chunks = [thumbnail_data[i:i + THUMBNAIL_CHUNK_SIZE]
+                  for i in range(0, len(thumbnail_data), THUMBNAIL_CHUNK_SIZE)]
+        _commit_thumbnail(db.transaction(), idea_id, thumbnail_hash(thumbnail_data), chunks,
+                          len(thumbnail_data), spilled_at)
+        if spilled_at is None:
+            thumbnail_store.pop(idea_id, None)
         return True
     except Exception as e:
         print(f"Error storing thumbnail: {e}")
-        # Fallback to memory store
-        thumbnail_store[idea_id] = thumbnail_data
+        # Fallback to memory store; a retried spill file is already there
+        if spilled_at is None:
+            thumbnail_store[idea_id] = thumbnail_data
         return False
 
 def get_thumbnail_from_firestore(idea_id):
-    """Retrieve thumbnail from Firestore"""
+    """Retrieve thumbnail from Firestore, reassembling its chunks"""
     try:
         doc = db.collection('thumbnails').document(idea_id).get()
         if doc.exists:
-            return doc.to_dict().get('data')
+            manifest = doc.to_dict()
+            # Thumbnails written before chunking kept the data inline
+            if 'data' in manifest:
+                return manifest['data']
+
+            refs = _thumbnail_chunk_refs(manifest['hash'], manifest['chunk_count'])
+            chunks = {snapshot.id: snapshot.to_dict() for snapshot in db.get_all(refs) if snapshot.exists}
+            if len(chunks) == len(refs):
+                thumbnail_data = ''.join(chunks[ref.id]['data'] for ref in refs)
+                if thumbnail_hash(thumbnail_data) == manifest['hash']:
+                    return thumbnail_data
+            print(f"Thumbnail chunks incomplete for idea: {idea_id}")
     except Exception as e:
         print(f"Error retrieving thumbnail: {e}")
     
     # Fallback to memory store
     return thumbnail_store.get(idea_id)
 
+def delete_thumbnail_from_firestore(idea_id):
+    """Remove an idea's thumbnail manifest and any chunks only it referenced"""
+    thumbnail_store.pop(idea_id, None)
+    try:
+        _remove_thumbnail(db.transaction(), idea_id)
+    except Exception as e:
+        print(f"Error deleting thumbnail: {e}")
+
+def resync_spilled_thumbnails():
+    """Retry the durable write for every thumbnail sitting in the fallback store"""
+    for idea_id in thumbnail_store.spilled_ids():
+        spilled_at = thumbnail_store.spilled_mtime(idea_id)
+        thumbnail_data = thumbnail_store.read_spilled(idea_id)
+        # Skip files replaced or removed by a request while they were being read
+        if not thumbnail_data or spilled_at is None or thumbnail_store.spilled_mtime(idea_id) != spilled_at:
+            continue
+        if not store_thumbnail_in_firestore(idea_id, thumbnail_data,
+                                            spilled_at=datetime.fromtimestamp(spilled_at).astimezone()):
+            continue
+        # Only drop the copy that was pushed, not one a failed request spilled since
+        if thumbnail_store.spilled_mtime(idea_id) == spilled_at:
+            thumbnail_store.pop(idea_id, None)
+        thumbnail_store.record_resync()
+
+def _thumbnail_resync_loop():
+    # One worker per host retries the shared spill directory
+    lock_file = acquire_host_lock(os.path.join(THUMBNAIL_SPILL_DIR, '.resync.lock'), THUMBNAIL_RESYNC_INTERVAL)
+    if lock_file is None:
+        print("Thumbnail resync disabled: spill directory lock unavailable")
+        return
+    while True:
+        time.sleep(THUMBNAIL_RESYNC_INTERVAL)
+        try:
+            resync_spilled_thumbnails()
+        except Exception as e:
+            print(f"Thumbnail resync error: {e}")
+
+if db is not None and THUMBNAIL_RESYNC_INTERVAL > 0:
+    threading.Thread(target=_thumbnail_resync_loop, name='thumbnail-resync', daemon=True).start()
+
+# Full-text search and near-duplicate detection over ideas
+# An in-process inverted index plus MinHash/LSH buckets, loaded from a disk
+# snapshot plus the ideas changed since it was taken, and kept current by the
+# idea write handlers.
+# The snapshot only avoids a full rebuild if it survives restarts, so on
+# ephemeral hosts point SEARCH_INDEX_PATH at a persistent disk
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', os.path.join(app.instance_path, 'search-index.json'))
+SEARCH_INDEX_SAVE_INTERVAL = int(os.getenv('SEARCH_INDEX_SAVE_INTERVAL', '60'))
+SEARCH_INDEX_REFRESH_INTERVAL = int(os.getenv('SEARCH_INDEX_REFRESH_INTERVAL', '30'))
+SEARCH_FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'topic': 2.0, 'key_points': 1.0, 'description': 1.0}
+SEARCH_MAX_PREFIX_TERMS = 50
+SEARCH_SNAPSHOT_VERSION = 4
+# updated_at and deleted_at are server timestamps, so each sync re-reads a few
+# seconds before the local clock's last sync to cover skew between the two
+SEARCH_SYNC_OVERLAP = 5
+# Deletion tombstones are pruned after this long; a snapshot older than that is rebuilt
+DELETED_IDEA_RETENTION_DAYS = int(os.getenv('DELETED_IDEA_RETENTION_DAYS', '30'))
+DELETED_IDEA_PRUNE_INTERVAL = 3600
+
+DUPLICATE_FIELDS = ['title', 'description', 'topic', 'key_points']
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', '0.5'))
+DUPLICATE_STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'i', 'in', 'is', 'it',
+    'my', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'video', 'what', 'why', 'with', 'you', 'your'
+}
+# 16 bands of 4 rows puts the LSH candidate threshold at roughly 0.5 Jaccard
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+MINHASH_BINS = MINHASH_BANDS * MINHASH_ROWS
+_MINHASH_BIN_BITS = MINHASH_BINS.bit_length() - 1
+_MINHASH_VALUE_MASK = 0xffffffff
+# Added per bin skipped when an empty bin borrows a neighbour's value
+_MINHASH_DENSIFY_OFFSET = 0x9e3779b1
+
+def record_idea_deletion(idea_id):
+    """Leave a tombstone so other workers' in-memory indexes can drop the idea"""
+    try:
+        db.collection('deleted_ideas').document(idea_id).set({'deleted_at': firestore.SERVER_TIMESTAMP})
+    except Exception as e:
+        print(f"Error recording deletion of idea {idea_id}: {e}")
+
+def deleted_idea_ids_since(since):
+    query = db.collection('deleted_ideas').where(filter=FieldFilter('deleted_at', '>=', since))
+    return [doc.id for doc in query.stream()]
+
+def prune_idea_deletions(batch_size=500):
+    """Delete tombstones older than the retention period"""
+    cutoff = datetime.now().astimezone() - timedelta(days=DELETED_IDEA_RETENTION_DAYS)
+    query = db.collection('deleted_ideas').where(filter=FieldFilter('deleted_at', '<', cutoff)).limit(batch_size)
+    while True:
+        docs = list(query.stream())
+        if not docs:
+            return
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        if len(docs) < batch_size:
+            return
+
+def tokenize(text):
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+def _field_text(value):
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value)
+    return str(value or '')
+
+def idea_term_weights(idea):
+    weights = {}
+    for field, weight in SEARCH_FIELD_WEIGHTS.items():
+        for term in tokenize(_field_text(idea.get(field))):
+            weights[term] = weights.get(term, 0.0) + weight
+    return weights
+
+def idea_shingles(idea):
+    """Word unigrams and bigrams of the idea's text, ignoring filler words"""
+    text = ' '.join(_field_text(idea.get(field)) for field in DUPLICATE_FIELDS)
+    tokens = [token for token in tokenize(text) if token not in DUPLICATE_STOP_WORDS]
+    shingles = set(tokens)
+    shingles.update(f'{first} {second}' for first, second in zip(tokens, tokens[1:]))
+    return shingles
+
+def minhash_signature(shingles):
+    """One-permutation MinHash: hash each shingle once, keep the minimum per bin.
+
+    The low bits of the hash pick the bin. Empty bins are densified by
+    borrowing from the next filled bin, so the signature always has
+    MINHASH_BINS values.
+    """
+    if not shingles:
+        return []
+    bins = [None] * MINHASH_BINS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = h & (MINHASH_BINS - 1)
+        value = (h >> _MINHASH_BIN_BITS) & _MINHASH_VALUE_MASK
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+
+    signature = list(bins)
+    for index, value in enumerate(bins):
+        if value is not None:
+            continue
+        distance = 1
+        while bins[(index + distance) % MINHASH_BINS] is None:
+            distance += 1
+        borrowed = bins[(index + distance) % MINHASH_BINS]
+        signature[index] = (borrowed + distance * _MINHASH_DENSIFY_OFFSET) & _MINHASH_VALUE_MASK
+    return signature
+
+def lsh_band_keys(signature):
+    """One int per band: the band number followed by its rows' 32-bit values"""
+    if not signature:
+        return []
+    keys = []
+    for band in range(MINHASH_BANDS):
+        key = band
+        for value in signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]:
+            key = key << 32 | value
+        keys.append(key)
+    return keys
+
+# Kept per idea for every worker's index, so it is stored compactly: terms are
+# interned and shared with the postings, weights and signature are flat arrays
+IndexedIdea = namedtuple('IndexedIdea', ['title', 'status', 'terms', 'weights', 'signature'])
+
+def _indexed_idea(title, status, terms, weights, signature):
+    return IndexedIdea(title, status, tuple(sys.intern(term) for term in terms),
+                       array('d', weights), array('I', signature))
+
+def index_document(idea):
+    term_weights = idea_term_weights(idea)
+    return _indexed_idea(idea.get('title', ''), idea.get('status', 'Idea'),
+                         term_weights.keys(), term_weights.values(),
+                         minhash_signature(idea_shingles(idea)))
+
+class IdeaSearchIndex:
+    """Inverted index from term to {idea_id: weight} with prefix lookup over a sorted vocabulary,
+    plus LSH buckets of MinHash signatures for finding near-duplicate ideas"""
+
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self._postings = {}
+        self._vocabulary = []
+        self._buckets = {}
+        self._docs = {}
+        # Weights repeat across millions of postings; keep one float object per value
+        self._weights = {}
+        self._lock = threading.RLock()
+        self._loaded = threading.Event()
+        self._touched = set()
+        self._dirty = False
+        self._synced_at = None
+
+    def _add(self, idea_id, doc, keep_sorted=True):
+        for term, weight in zip(doc.terms, doc.weights):
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self._vocabulary, term)
+            postings[idea_id] = self._weights.setdefault(weight, weight)
+        for key in lsh_band_keys(doc.signature):
+            bucket = self._buckets.get(key)
+            # Nearly every bucket holds one idea, so only shared buckets get a set
+            if bucket is None:
+                self._buckets[key] = idea_id
+            elif isinstance(bucket, set):
+                bucket.add(idea_id)
+            elif bucket != idea_id:
+                self._buckets[key] = {bucket, idea_id}
+        self._docs[idea_id] = doc
+
+    def _remove(self, idea_id):
+        doc = self._docs.pop(idea_id, None)
+        if doc is None:
+            return
+        for term in doc.terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(idea_id, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._vocabulary, term)
+                if position < len(self._vocabulary) and self._vocabulary[position] == term:
+                    del self._vocabulary[position]
+        for key in lsh_band_keys(doc.signature):
+            bucket = self._buckets.get(key)
+            if bucket == idea_id:
+                del self._buckets[key]
+            elif isinstance(bucket, set):
+                bucket.discard(idea_id)
+                if len(bucket) == 1:
+                    self._buckets[key] = bucket.pop()
+
+    def _replace(self, idea_id, doc):
+        with self._lock:
+            self._remove(idea_id)
+            self._add(idea_id, doc)
+            self._touched.add(idea_id)
+            self._dirty = True
+
+    def upsert(self, idea_id, idea):
+        self._replace(idea_id, index_document(idea))
+
+    def remove(self, idea_id):
+        with self._lock:
+            self._remove(idea_id)
+            self._touched.add(idea_id)
+            self._dirty = True
+
+    def load(self):
+        """Populate from the snapshot and the ideas updated since, or a full scan without one"""
+        docs = {}
+        synced_at = None
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            if snapshot.get('version') != SEARCH_SNAPSHOT_VERSION:
+                raise ValueError(f"snapshot version {snapshot.get('version')}")
+            docs = {idea_id: _indexed_idea(*fields) for idea_id, fields in snapshot['docs'].items()}
+            synced_at = datetime.fromisoformat(snapshot['synced_at'])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Search index snapshot unreadable, rebuilding: {e}")
+            docs = {}
+        if synced_at is not None and synced_at < datetime.now().astimezone() - timedelta(days=DELETED_IDEA_RETENTION_DAYS):
+            # Tombstones for deletions since then may already be pruned
+            print("Search index snapshot is older than the deletion retention, rebuilding")
+            docs, synced_at = {}, None
+
+        scan_started = datetime.now().astimezone()
+        changed = synced_at is None
+        query = db.collection('ideas')
+        if synced_at is not None:
+            since = synced_at - timedelta(seconds=SEARCH_SYNC_OVERLAP)
+            query = query.where(filter=FieldFilter('updated_at', '>=', since))
+        for doc in query.stream():
+            changed = True
+            docs[doc.id] = index_document(doc.to_dict())
+        if synced_at is not None:
+            # The snapshot may predate deletions made by any worker
+            for idea_id in deleted_idea_ids_since(since):
+                changed = changed or idea_id in docs
+                docs.pop(idea_id, None)
+
+        with self._lock:
+            # Writes that landed while loading are newer than what was just read
+            for idea_id, doc in docs.items():
+                if idea_id not in self._touched:
+                    self._add(idea_id, doc, keep_sorted=False)
+            self._vocabulary = sorted(self._postings)
+            self._touched.clear()
+            self._synced_at = scan_started
+            self._dirty = self._dirty or changed
+        self._loaded.set()
+        self.save()
+
+    def refresh(self):
+        """Pick up ideas other workers changed or deleted since the last sync"""
+        if not self._loaded.is_set():
+            return
+        scan_started = datetime.now().astimezone()
+        since = self._synced_at - timedelta(seconds=SEARCH_SYNC_OVERLAP)
+        query = db.collection('ideas').where(filter=FieldFilter('updated_at', '>=', since))
+        for doc in query.stream():
+            indexed = index_document(doc.to_dict())
+            # The overlap re-reads ideas already seen; leave those untouched
+            if self._docs.get(doc.id) != indexed:
+                self._replace(doc.id, indexed)
+        for idea_id in deleted_idea_ids_since(since):
+            if idea_id in self._docs:
+                self.remove(idea_id)
+        self._synced_at = scan_started
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or self._synced_at is None:
+                return
+            snapshot = {
+                'version': SEARCH_SNAPSHOT_VERSION,
+                'synced_at': self._synced_at.isoformat(),
+                'docs': dict(self._docs)
+            }
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+            tmp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                # IndexedIdea entries are written as lists, their arrays via default
+                json.dump(snapshot, f, default=list)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Error saving search index snapshot: {e}")
+            self._dirty = True
+
+    def _matching_terms(self, token):
+        """Exact match at full weight plus vocabulary terms starting with the token"""
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+        start = bisect.bisect_left(self._vocabulary, token)
+        for term in self._vocabulary[start:start + SEARCH_MAX_PREFIX_TERMS + 1]:
+            if not term.startswith(token):
+                break
+            if term != token:
+                matches[term] = 0.5
+        return matches
+
+    def search(self, query, limit=20):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            total_docs = max(len(self._docs), 1)
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, match_weight in self._matching_terms(token).items():
+                    postings = self._postings[term]
+                    idf = math.log(1 + total_docs / len(postings))
+                    for idea_id, weight in postings.items():
+                        token_scores[idea_id] = token_scores.get(idea_id, 0.0) + weight * idf * match_weight
+                # Every query token has to match
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {idea_id: score + token_scores[idea_id]
+                              for idea_id, score in scores.items() if idea_id in token_scores}
+                if not scores:
+                    return []
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [{
+                'id': idea_id,
+                'title': self._docs[idea_id].title,
+                'status': self._docs[idea_id].status,
+                'score': round(score, 4)
+            } for idea_id, score in top]
+
+    def find_duplicates(self, idea, exclude_id=None, limit=5):
+        """Ideas sharing an LSH bucket with this one, scored by estimated Jaccard similarity"""
+        signature = minhash_signature(idea_shingles(idea))
+        with self._lock:
+            candidates = set()
+            for key in lsh_band_keys(signature):
+                bucket = self._buckets.get(key)
+                if isinstance(bucket, set):
+                    candidates.update(bucket)
+                elif bucket is not None:
+                    candidates.add(bucket)
+            candidates.discard(exclude_id)
+
+            matches = []
+            for idea_id in candidates:
+                doc = self._docs[idea_id]
+                agreement = sum(1 for mine, theirs in zip(signature, doc.signature) if mine == theirs)
+                similarity = agreement / len(signature)
+                if similarity >= DUPLICATE_THRESHOLD:
+                    matches.append({
+                        'id': idea_id,
+                        'title': doc.title,
+                        'status': doc.status,
+                        'similarity': round(similarity, 3)
+                    })
+        return heapq.nlargest(limit, matches, key=lambda match: match['similarity'])
+
+    def wait_until_loaded(self, timeout=None):
+        return self._loaded.wait(timeout)
+
+search_index = IdeaSearchIndex(SEARCH_INDEX_PATH)
+
+def _search_index_loop():
+    try:
+        search_index.load()
+    except Exception as e:
+        print(f"Search index load error: {e}")
+        return
+    last_saved = last_pruned = time.time()
+    while True:
+        time.sleep(max(1, min(SEARCH_INDEX_REFRESH_INTERVAL, SEARCH_INDEX_SAVE_INTERVAL)))
+        try:
+            search_index.refresh()
+        except Exception as e:
+            print(f"Search index refresh error: {e}")
+        if time.time() - last_saved >= SEARCH_INDEX_SAVE_INTERVAL:
+            search_index.save()
+            last_saved = time.time()
+        if time.time() - last_pruned >= DELETED_IDEA_PRUNE_INTERVAL:
+            try:
+                prune_idea_deletions()
+            except Exception as e:
+                print(f"Error pruning idea tombstones: {e}")
+            last_pruned = time.time()
+
+def reindex_idea(idea_id, changes):
+    """Re-read and reindex an idea after a partial update touched searchable fields"""
+    if not set(changes) & (set(SEARCH_FIELD_WEIGHTS) | {'status'}):
+        return
+    try:
+        doc = db.collection('ideas').document(idea_id).get()
+        if doc.exists:
+            search_index.upsert(idea_id, doc.to_dict())
+    except Exception as e:
+        print(f"Error reindexing idea {idea_id}: {e}")
+
+if db is not None:
+    threading.Thread(target=_search_index_loop, name='search-index', daemon=True).start()
+
+# Multipart image uploads
+# The idea and background-removal endpoints accept an image file in a
+# multipart/form-data request as well as a base64 data URL in a JSON body.
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def is_multipart_request():
+    return request.mimetype == 'multipart/form-data'
+
+def validate_image_upload(upload):
+    if not (upload.mimetype or '').startswith('image/'):
+        raise UploadError(f'Expected an image upload, got {upload.mimetype or "unknown type"}', 415)
+    upload.stream.seek(0, os.SEEK_END)
+    size = upload.stream.tell()
+    upload.stream.seek(0)
+    if size > MAX_IMAGE_UPLOAD_BYTES:
+        raise UploadError(f'Image is {size} bytes; the limit is {MAX_IMAGE_UPLOAD_BYTES}', 413)
+    return upload
+
+def upload_to_data_url(upload):
+    """Base64-encode an uploaded file piece by piece straight from its spooled stream"""
+    parts = []
+    upload.stream.seek(0)
+    while True:
+        # A multiple of 3 bytes encodes without padding, so the pieces concatenate cleanly
+        chunk = upload.stream.read(3 * 256 * 1024)
+        if not chunk:
+            break
+        parts.append(base64.b64encode(chunk).decode('ascii'))
+    upload.stream.seek(0)
+    return f"data:{upload.mimetype or 'image/png'};base64,{''.join(parts)}"
+
+def _pop_inline_thumbnail(data):
+    """Take a base64 thumbnail out of data['assets'] so it isn't stored in the idea document"""
+    assets = data.get('assets')
+    if isinstance(assets, dict) and 'thumbnail' in assets:
+        return assets.pop('thumbnail') or None
+    return None
+
+def read_idea_payload():
+    """Idea fields and thumbnail data URL from either request format.
+
+    Multipart requests carry the idea as JSON in a 'data' field and the
+    thumbnail as an image file named 'thumbnail', which takes precedence over
+    an inline assets.thumbnail.
+    """
+    if is_multipart_request():
+        try:
+            data = json.loads(request.form.get('data') or '{}')
+        except ValueError:
+            raise UploadError("The 'data' field must be JSON")
+        if not isinstance(data, dict):
+            raise UploadError("The 'data' field must be a JSON object")
+        thumbnail_data = _pop_inline_thumbnail(data)
+        upload = request.files.get('thumbnail')
+        if upload:
+            thumbnail_data = upload_to_data_url(validate_image_upload(upload))
+        return data, thumbnail_data
+
+    data = request.json
+    if not isinstance(data, dict):
+        raise UploadError('The request body must be a JSON object')
+    return data, _pop_inline_thumbnail(data)
+
+    data = request.json
+    thumbnail_data = None
+    assets = data.get('assets')
+    if assets and 'thumbnail' in assets and assets['thumbnail']:
+        thumbnail_data = assets['thumbnail']
+        # Don't store the actual data in the idea document
+        del assets['thumbnail']
+    return data, thumbnail_data
+
+@app.errorhandler(UploadError)
+def handle_upload_error(e):
+    return jsonify({'error': str(e)}), e.status_code
+
+@app.errorhandler(413)
+def handle_request_too_large(e):
+    return jsonify({'error': f'Request body exceeds the {MAX_REQUEST_BYTES} byte limit'}), 413
+
 # Routes for pages
 @app.route('/')
 def index():
@@ -112,18 +1108,12 @@ def settings():
 @app.route('/api/ideas', methods=['GET', 'POST'])
 def manage_ideas():
     if request.method == 'POST':
-        data = request.json
-        
         # Handle assets separately to avoid Firestore size limits
-        assets = data.get('assets', {})
-        thumbnail_data = None
-        if assets and 'thumbnail' in assets and assets['thumbnail']:
-            # Store thumbnail separately
-            thumbnail_data = assets['thumbnail']
+        data, thumbnail_data = read_idea_payload()
+        assets = data.get('assets') or {}
+        if thumbnail_data:
             # Mark that this idea has a thumbnail
             assets['has_thumbnail'] = True
-            # Don't store the actual data in the idea document
-            del assets['thumbnail']
         
         idea = {
             'title': data.get('title', ''),
@@ -147,13 +1137,17 @@ def manage_ideas():
             # Store thumbnail separately if provided
             if thumbnail_data:
                 store_thumbnail_in_firestore(idea_id, thumbnail_data)
+            duplicates = search_index.find_duplicates(idea, exclude_id=idea_id)
+            search_index.upsert(idea_id, idea)
+            invalidate_dashboard_cache()
             
             # Return only serializable data, not SERVER_TIMESTAMP
             response_data = {k: v for k, v in idea.items() if k not in ['created_at', 'updated_at']}
             response_data['id'] = idea_id
+            response_data['duplicates'] = duplicates
             
-            # Include thumbnail in response
-            if thumbnail_data:
+            # Include thumbnail in response; uploaders already have the file
+            if thumbnail_data and not is_multipart_request():
                 response_data['assets']['thumbnail'] = thumbnail_data
                 
             return jsonify(response_data), 201
@@ -162,8 +1156,12 @@ def manage_ideas():
             print(f"Firestore error with assets: {e}")
             idea_without_assets = {k: v for k, v in idea.items() if k != 'assets'}
             doc_ref = db.collection('ideas').add(idea_without_assets)
+            duplicates = search_index.find_duplicates(idea_without_assets, exclude_id=doc_ref[1].id)
+            search_index.upsert(doc_ref[1].id, idea_without_assets)
+            invalidate_dashboard_cache()
             response_data = {k: v for k, v in idea_without_assets.items() if k not in ['created_at', 'updated_at']}
             response_data['id'] = doc_ref[1].id
+            response_data['duplicates'] = duplicates
             return jsonify(response_data), 201
     
     # GET request
@@ -182,6 +1180,24 @@ def manage_ideas():
         ideas.append(idea)
     return jsonify(ideas)
 
+@app.route('/api/ideas/search', methods=['GET'])
+def search_ideas():
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    if not query:
+        return jsonify({'query': query, 'results': []})
+
+    if not search_index.wait_until_loaded(timeout=5):
+        return jsonify({'error': 'Search index is still loading, try again shortly'}), 503
+
+    started = time.perf_counter()
+    results = search_index.search(query, limit)
+    return jsonify({
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
 @app.route('/api/ideas/<idea_id>', methods=['GET', 'PUT', 'DELETE'])
 def manage_idea(idea_id):
     doc_ref = db.collection('ideas').document(idea_id)
@@ -210,18 +1226,14 @@ def manage_idea(idea_id):
         return jsonify({'error': 'Idea not found'}), 404
     
     elif request.method == 'PUT':
-        data = request.json
-        
         # Handle assets separately to avoid Firestore size limits
-        thumbnail_data = None
-        if 'assets' in data:
-            assets = data['assets']
-            if assets and 'thumbnail' in assets and assets['thumbnail']:
-                thumbnail_data = assets['thumbnail']
-                # Mark that this idea has a thumbnail
-                assets['has_thumbnail'] = True
-                # Don't store the actual data in the idea document
-                del assets['thumbnail']
+        data, thumbnail_data = read_idea_payload()
+        if thumbnail_data:
+            # Mark that this idea has a thumbnail; the dotted path would conflict with an 'assets' key
+            if 'assets' in data:
+                data['assets'] = {**(data['assets'] or {}), 'has_thumbnail': True}
+            else:
+                data['assets.has_thumbnail'] = True
         
         data['updated_at'] = firestore.SERVER_TIMESTAMP
         
@@ -231,6 +1243,8 @@ def manage_idea(idea_id):
             # Store thumbnail separately if provided
             if thumbnail_data:
                 store_thumbnail_in_firestore(idea_id, thumbnail_data)
+            reindex_idea(idea_id, data)
+            invalidate_dashboard_cache()
                 
             return jsonify({'message': 'Idea updated successfully'})
         except Exception as e:
@@ -239,13 +1253,46 @@ def manage_idea(idea_id):
             if 'assets' in data:
                 del data['assets']
             doc_ref.update(data)
+            reindex_idea(idea_id, data)
+            invalidate_dashboard_cache()
             return jsonify({'message': 'Idea updated successfully (without assets)'})
     
     elif request.method == 'DELETE':
         doc_ref.delete()
+        record_idea_deletion(idea_id)
+        delete_thumbnail_from_firestore(idea_id)
+        search_index.remove(idea_id)
+        invalidate_dashboard_cache()
         return jsonify({'message': 'Idea deleted successfully'})
 
+@app.route('/api/ideas/<idea_id>/thumbnail', methods=['GET'])
+def get_idea_thumbnail(idea_id):
+    """Serve a stored thumbnail as an image so lists don't need to embed it"""
+    thumbnail = get_thumbnail_from_firestore(idea_id)
+    if not thumbnail:
+        return jsonify({'error': 'Thumbnail not found'}), 404
+
+    mimetype = 'image/png'
+    if thumbnail.startswith('data:'):
+        header, thumbnail = thumbnail.split(',', 1)
+        mimetype = header[5:].split(';')[0] or mimetype
+
+    try:
+        image_bytes = base64.b64decode(thumbnail, validate=True)
+    except (binascii.Error, ValueError):
+        print(f"Stored thumbnail for idea {idea_id} is not valid base64")
+        return jsonify({'error': 'Thumbnail not found'}), 404
+
+    response = app.response_class(image_bytes, mimetype=mimetype)
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
+@app.route('/api/thumbnail-cache/stats', methods=['GET'])
+def get_thumbnail_cache_stats():
+    return jsonify(thumbnail_store.snapshot_stats())
+
 @app.route('/api/generate/title', methods=['POST'])
+@coalesce_requests
 def generate_title():
     data = request.json
     topic = data.get('topic', '')
@@ -276,6 +1323,7 @@ def generate_title():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate/description', methods=['POST'])
+@coalesce_requests
 def generate_description():
     data = request.json
     title = data.get('title', '')
@@ -307,6 +1355,7 @@ def generate_description():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate/thumbnail-text', methods=['POST'])
+@coalesce_requests
 def generate_thumbnail_text():
     data = request.json
     title = data.get('title', '')
@@ -337,6 +1386,7 @@ def generate_thumbnail_text():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate/everything', methods=['POST'])
+@coalesce_requests
 def generate_everything():
     data = request.json
     free_text_idea = data.get('idea', '')
@@ -483,7 +1533,13 @@ def generate_everything():
             **titles_data,
             **desc_data,
             **concepts_data,
-            "original_idea": free_text_idea
+            "original_idea": free_text_idea,
+            # Existing backlog ideas this one looks like a rewording of
+            "duplicates": search_index.find_duplicates({
+                'title': free_text_idea,
+                'topic': structure_data.get('topic', ''),
+                'key_points': structure_data.get('key_points', '')
+            })
         }
         
         return jsonify(result)
@@ -492,6 +1548,7 @@ def generate_everything():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate/image-prompt', methods=['POST'])
+@coalesce_requests
 def generate_image_prompt():
     data = request.json
     concept = data.get('concept', {})
@@ -579,6 +1636,7 @@ def generate_image_prompt():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate/image', methods=['POST'])
+@coalesce_requests
 def generate_image():
     data = request.json
     prompt = data.get('prompt', '')
@@ -639,6 +1697,7 @@ def manage_schedule():
             'updated_at': firestore.SERVER_TIMESTAMP
         }
         doc_ref.set(schedule)
+        invalidate_dashboard_cache()
         return jsonify(schedule)
     
     # GET request
@@ -674,6 +1733,7 @@ def manage_streak():
             'count': new_streak,
             'last_update': firestore.SERVER_TIMESTAMP
         })
+        invalidate_dashboard_cache()
         return jsonify({'count': new_streak})
     
     # GET request
@@ -682,6 +1742,465 @@ def manage_streak():
         return jsonify(doc.to_dict())
     return jsonify({'count': 0})
 
+# Dashboard summary
+# Everything the home page needs in one small response, built from count
+# queries and a limited schedule_date query instead of reading every idea.
+IDEA_STATUSES = ['Idea', 'Drafting', 'Editing', 'Ready', 'Scheduled', 'Published']
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '30'))
+DASHBOARD_RECENT_LIMIT = 6
+DASHBOARD_SUMMARY_FIELDS = ['title', 'description', 'status', 'priority', 'schedule_date', 'assets.has_thumbnail']
+
+_dashboard_cache = {}
+_dashboard_cache_lock = threading.Lock()
+
+def invalidate_dashboard_cache():
+    with _dashboard_cache_lock:
+        _dashboard_cache.clear()
+
+def count_documents(query):
+    """Count matching documents server-side without reading them"""
+    result = query.count(alias='total').get()
+    return int(result[0][0].value)
+
+def compute_next_due(schedule, now=None):
+    """Next posting deadline from the schedule's cadence and post_by_time"""
+    now = now or datetime.now().astimezone()
+    try:
+        hours, minutes = [int(part) for part in schedule.get('post_by_time', '18:00').split(':')]
+    except (AttributeError, ValueError):
+        return None
+
+    if schedule.get('cadence') == 'custom':
+        # custom_days uses JavaScript numbering (0 = Sunday)
+        days = set(schedule.get('custom_days') or [])
+        if not days:
+            return None
+    else:
+        days = set(range(7))
+
+    for offset in range(8):
+        candidate = (now + timedelta(days=offset)).replace(hour=hours, minute=minutes, second=0, microsecond=0)
+        if candidate > now and (candidate.weekday() + 1) % 7 in days:
+            return candidate
+    return None
+
+def summarise_idea(doc):
+    idea = doc.to_dict()
+    return {
+        'id': doc.id,
+        'title': idea.get('title', ''),
+        'description': idea.get('description', ''),
+        'status': idea.get('status', 'Idea'),
+        'priority': idea.get('priority', 'medium'),
+        'schedule_date': idea.get('schedule_date'),
+        'has_thumbnail': bool((idea.get('assets') or {}).get('has_thumbnail'))
+    }
+
+def build_dashboard(upcoming_limit, tz=None):
+    # post_by_time is wall-clock time for the creator, so use their zone when known
+    now = datetime.now(tz) if tz else datetime.now().astimezone()
+    today = now.date()
+    week_start = today - timedelta(days=(today.weekday() + 1) % 7)
+    ideas = db.collection('ideas')
+
+    counts = {
+        status: count_documents(ideas.where(filter=FieldFilter('status', '==', status)))
+        for status in IDEA_STATUSES
+    }
+    counts['total'] = count_documents(ideas)
+
+    week_count = count_documents(
+        ideas.where(filter=FieldFilter('schedule_date', '>=', week_start.isoformat()))
+             .where(filter=FieldFilter('schedule_date', '<', (week_start + timedelta(days=7)).isoformat()))
+    )
+
+    upcoming_docs = (
+        ideas.where(filter=FieldFilter('schedule_date', '>=', today.isoformat()))
+             .order_by('schedule_date')
+             .limit(upcoming_limit)
+             .select(DASHBOARD_SUMMARY_FIELDS)
+             .stream()
+    )
+    recent_docs = (
+        ideas.order_by('created_at', direction=firestore.Query.DESCENDING)
+             .limit(DASHBOARD_RECENT_LIMIT)
+             .select(DASHBOARD_SUMMARY_FIELDS)
+             .stream()
+    )
+
+    streak_doc = db.collection('settings').document('streak').get()
+    schedule_doc = db.collection('settings').document('schedule').get()
+    schedule = schedule_doc.to_dict() if schedule_doc.exists else {'cadence': 'daily', 'post_by_time': '18:00'}
+    next_due = compute_next_due(schedule, now)
+
+    return {
+        'counts': counts,
+        'week_count': week_count,
+        'upcoming': [summarise_idea(doc) for doc in upcoming_docs],
+        'recent': [summarise_idea(doc) for doc in recent_docs],
+        'streak': streak_doc.to_dict().get('count', 0) if streak_doc.exists else 0,
+        'next_due': next_due.isoformat() if next_due else None
+    }
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    upcoming_limit = max(1, min(request.args.get('upcoming', 5, type=int), 50))
+    tz_name = request.args.get('tz', '')
+    try:
+        tz = ZoneInfo(tz_name) if tz_name else None
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = None
+    cache_key = (upcoming_limit, tz_name if tz else '')
+
+    with _dashboard_cache_lock:
+        cached = _dashboard_cache.get(cache_key)
+    if cached and time.time() - cached[0] < DASHBOARD_CACHE_TTL:
+        return jsonify(cached[1])
+
+    try:
+        dashboard = build_dashboard(upcoming_limit, tz)
+    except Exception as e:
+        print(f"Dashboard error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    with _dashboard_cache_lock:
+        _dashboard_cache[cache_key] = (time.time(), dashboard)
+    return jsonify(dashboard)
+
+# Posting reminders
+# Reminder times for the cadence and for each scheduled idea sit in one heap;
+# a single thread sleeps until the earliest one and hands it to a sink. One
+# process per host owns the engine through a file lock and polls Firestore for
+# schedule edits, idea writes and deletion tombstones, replacing only the
+# entries they affect.
+REMINDER_OFFSETS = {'60min': timedelta(minutes=60), '10min': timedelta(minutes=10)}
+REMINDER_SINK = os.getenv('REMINDER_SINK', 'log')
+REMINDER_WEBHOOK_URL = os.getenv('REMINDER_WEBHOOK_URL')
+REMINDER_TIMEZONE = os.getenv('REMINDER_TIMEZONE')
+REMINDERS_ENABLED = os.getenv('REMINDERS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+REMINDER_LOCK_PATH = os.getenv('REMINDER_LOCK_PATH', os.path.join(app.instance_path, 'reminders.lock'))
+REMINDER_POLL_INTERVAL = int(os.getenv('REMINDER_POLL_INTERVAL', '30'))
+REMINDER_POLL_OVERLAP = 5
+REMINDER_PUBLISH_LIMIT = 100
+DEFAULT_SCHEDULE = {
+    'cadence': 'daily',
+    'custom_days': [],
+    'post_by_time': '18:00',
+    'reminders': {'60min': True, '10min': True}
+}
+
+class LogReminderSink:
+    def deliver(self, reminder):
+        print(f"Reminder: {reminder['title'] or 'Next video'} due at {reminder['due_at']} ({reminder['kind']} before)")
+
+class WebhookReminderSink:
+    def __init__(self, url):
+        self.url = url
+
+    def deliver(self, reminder):
+        response = requests.post(self.url, json=reminder, timeout=10)
+        response.raise_for_status()
+
+class MemoryReminderSink:
+    """Keeps the most recent reminders in memory; useful locally and in development"""
+
+    def __init__(self, maxlen=100):
+        self.delivered = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def deliver(self, reminder):
+        with self._lock:
+            self.delivered.append(reminder)
+
+    def recent(self):
+        with self._lock:
+            return list(self.delivered)
+
+def create_reminder_sink():
+    if REMINDER_SINK == 'webhook' and REMINDER_WEBHOOK_URL:
+        return WebhookReminderSink(REMINDER_WEBHOOK_URL)
+    if REMINDER_SINK == 'memory':
+        return MemoryReminderSink()
+    return LogReminderSink()
+
+def idea_due_at(schedule_date, post_by_time, tz):
+    """Posting deadline for an idea scheduled on a date, or None if it can't be parsed"""
+    try:
+        day = datetime.fromisoformat(str(schedule_date)[:10]).date()
+        hours, minutes = [int(part) for part in post_by_time.split(':')]
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return datetime(day.year, day.month, day.day, hours, minutes, tzinfo=tz)
+
+class ReminderScheduler:
+    """Heap of pending reminders per channel, woken only for the earliest one.
+
+    Entries are never removed in place: each key remembers the sequence number of
+    its live entry, and anything else for that key is dropped when it surfaces.
+    """
+
+    def __init__(self, sink, tz=None):
+        self.sink = sink
+        self.tz = tz or datetime.now().astimezone().tzinfo
+        self._heap = []
+        self._live = {}
+        self._schedules = {}
+        self._ideas = {}
+        self._idea_dates = {}
+        self._date_counts = {}
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def _now(self):
+        return datetime.now(self.tz)
+
+    def _push(self, key, fire_at, reminder):
+        """Replace whatever is pending for key. Caller holds the condition."""
+        self._sequence += 1
+        self._live[key] = self._sequence
+        heapq.heappush(self._heap, (fire_at.timestamp(), self._sequence, key, reminder))
+
+    def _cancel(self, key):
+        self._live.pop(key, None)
+
+    def _is_live(self, entry):
+        return self._live.get(entry[2]) == entry[1]
+
+    def _compact(self):
+        """Rebuild the heap once stale entries clearly outnumber live ones"""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    def _schedule_cadence(self, channel, kind):
+        schedule = self._schedules.get(channel, DEFAULT_SCHEDULE)
+        key = (channel, 'cadence', kind)
+        if not (schedule.get('reminders') or {}).get(kind):
+            self._cancel(key)
+            return
+        offset = REMINDER_OFFSETS[kind]
+        due = compute_next_due(schedule, self._now() + offset)
+        if due is None:
+            self._cancel(key)
+            return
+        self._push(key, due - offset, {
+            'channel': channel, 'kind': kind, 'due_at': due.isoformat(), 'idea_id': None, 'title': None
+        })
+
+    def _schedule_idea(self, channel, idea_id):
+        idea = self._ideas.get((channel, idea_id))
+        schedule = self._schedules.get(channel, DEFAULT_SCHEDULE)
+        now = self._now()
+        due = None
+        if idea and idea.get('status') != 'Published':
+            due = idea_due_at(idea.get('schedule_date'), schedule.get('post_by_time', '18:00'), self.tz)
+        for kind, offset in REMINDER_OFFSETS.items():
+            key = (channel, 'idea', idea_id, kind)
+            if due is None or not (schedule.get('reminders') or {}).get(kind) or due - offset <= now:
+                self._cancel(key)
+                continue
+            self._push(key, due - offset, {
+                'channel': channel, 'kind': kind, 'due_at': due.isoformat(),
+                'idea_id': idea_id, 'title': idea.get('title', '')
+            })
+
+    def _set_idea_date(self, channel, idea_id, due_date):
+        """Track how many ideas are scheduled on each date, per channel"""
+        counts = self._date_counts.setdefault(channel, {})
+        previous = self._idea_dates.pop((channel, idea_id), None)
+        if previous is not None:
+            counts[previous] -= 1
+            if not counts[previous]:
+                del counts[previous]
+        if due_date is not None:
+            self._idea_dates[(channel, idea_id)] = due_date
+            counts[due_date] = counts.get(due_date, 0) + 1
+
+    def update_schedule(self, schedule, channel='default'):
+        with self._condition:
+            self._schedules[channel] = {**DEFAULT_SCHEDULE, **schedule}
+            for kind in REMINDER_OFFSETS:
+                self._schedule_cadence(channel, kind)
+            # post_by_time and the enabled reminders apply to every scheduled idea
+            for idea_channel, idea_id in list(self._ideas):
+                if idea_channel == channel:
+                    self._schedule_idea(channel, idea_id)
+            self._compact()
+            self._condition.notify()
+
+    def update_idea(self, idea_id, changes, channel='default'):
+        with self._condition:
+            idea = {**self._ideas.get((channel, idea_id), {}), **{
+                field: changes[field] for field in ('title', 'status', 'schedule_date') if field in changes
+            }}
+            if idea.get('schedule_date'):
+                self._ideas[(channel, idea_id)] = idea
+                self._set_idea_date(channel, idea_id, str(idea['schedule_date'])[:10])
+            else:
+                self._ideas.pop((channel, idea_id), None)
+                self._set_idea_date(channel, idea_id, None)
+            self._schedule_idea(channel, idea_id)
+            self._compact()
+            self._condition.notify()
+
+    def remove_idea(self, idea_id, channel='default'):
+        with self._condition:
+            self._ideas.pop((channel, idea_id), None)
+            self._set_idea_date(channel, idea_id, None)
+            for kind in REMINDER_OFFSETS:
+                self._cancel((channel, 'idea', idea_id, kind))
+            self._compact()
+            self._condition.notify()
+
+    def upcoming(self, limit=20, channel='default'):
+        with self._condition:
+            live = [entry for entry in self._heap if self._is_live(entry) and entry[2][0] == channel]
+        return [
+            {**reminder, 'fire_at': datetime.fromtimestamp(fire_at, self.tz).isoformat()}
+            for fire_at, _, _, reminder in heapq.nsmallest(limit, live)
+        ]
+
+    def _next_due_reminder(self):
+        """Block until the earliest live reminder is due and pop it"""
+        with self._condition:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    entry = heapq.heappop(self._heap)
+                    if not self._is_live(entry):
+                        continue
+                    fire_at, _, key, reminder = entry
+                    self._cancel(key)
+                    if key[1] == 'cadence':
+                        # A scheduled idea for the same slot already carries this reminder
+                        covered = self._date_counts.get(key[0], {}).get(reminder['due_at'][:10])
+                        self._schedule_cadence(key[0], key[2])
+                        if covered:
+                            continue
+                    return {**reminder, 'fire_at': datetime.fromtimestamp(fire_at, self.tz).isoformat()}
+                self._condition.wait(self._heap[0][0] - now if self._heap else None)
+
+    def run(self, on_delivered=None):
+        while True:
+            reminder = self._next_due_reminder()
+            try:
+                self.sink.deliver(reminder)
+            except Exception as e:
+                print(f"Reminder delivery failed: {e}")
+            if on_delivered is not None:
+                on_delivered()
+
+def _load_reminders():
+    """Seed the scheduler from the stored schedule and upcoming scheduled ideas"""
+    synced_at = datetime.now().astimezone()
+    schedule_doc = db.collection('settings').document('schedule').get()
+    schedule = schedule_doc.to_dict() if schedule_doc.exists else DEFAULT_SCHEDULE
+    reminder_scheduler.update_schedule(schedule)
+
+    today = datetime.now(reminder_scheduler.tz).date().isoformat()
+    docs = (
+        db.collection('ideas')
+          .where(filter=FieldFilter('schedule_date', '>=', today))
+          .select(['title', 'status', 'schedule_date'])
+          .stream()
+    )
+    for doc in docs:
+        reminder_scheduler.update_idea(doc.id, doc.to_dict())
+    return synced_at, schedule.get('updated_at')
+
+def _poll_reminder_changes(since, schedule_updated_at):
+    """Apply schedule edits, idea writes and idea deletions made by any worker since the last poll"""
+    polled_at = datetime.now().astimezone()
+    schedule_doc = db.collection('settings').document('schedule').get()
+    if schedule_doc.exists and schedule_doc.to_dict().get('updated_at') != schedule_updated_at:
+        schedule = schedule_doc.to_dict()
+        reminder_scheduler.update_schedule(schedule)
+        schedule_updated_at = schedule.get('updated_at')
+
+    # Overlap polls a little so clock skew against server timestamps can't drop a write
+    window_start = since - timedelta(seconds=REMINDER_POLL_OVERLAP)
+    docs = (
+        db.collection('ideas')
+          .where(filter=FieldFilter('updated_at', '>=', window_start))
+          .select(['title', 'status', 'schedule_date'])
+          .stream()
+    )
+    for doc in docs:
+        reminder_scheduler.update_idea(doc.id, {'schedule_date': None, **doc.to_dict()})
+    for idea_id in deleted_idea_ids_since(window_start):
+        reminder_scheduler.remove_idea(idea_id)
+    return polled_at, schedule_updated_at
+
+_published_reminders = None
+_publish_lock = threading.Lock()
+
+def publish_reminders():
+    """Write the owner's pending reminders to Firestore so any worker can serve them"""
+    global _published_reminders
+    status = {
+        'owner_pid': os.getpid(),
+        'upcoming': reminder_scheduler.upcoming(REMINDER_PUBLISH_LIMIT),
+        # Only the memory sink keeps what it delivered
+        'delivered': reminder_scheduler.sink.recent() if hasattr(reminder_scheduler.sink, 'recent') else []
+    }
+    with _publish_lock:
+        if status == _published_reminders:
+            return
+        try:
+            db.collection('settings').document('reminders').set({**status, 'updated_at': firestore.SERVER_TIMESTAMP})
+            _published_reminders = status
+        except Exception as e:
+            print(f"Error publishing reminders: {e}")
+
+def _reminder_loop():
+    # Held for the life of the process; the OS releases it if the owner dies
+    lock_file = acquire_host_lock(REMINDER_LOCK_PATH, REMINDER_POLL_INTERVAL)
+    if lock_file is None:
+        print("Reminder engine disabled: lock file unavailable")
+        return
+    print(f"Reminder engine started in process {os.getpid()}")
+    try:
+        synced_at, schedule_updated_at = _load_reminders()
+    except Exception as e:
+        print(f"Reminder load error: {e}")
+        synced_at, schedule_updated_at = datetime.now().astimezone(), None
+    publish_reminders()
+    threading.Thread(target=reminder_scheduler.run, args=(publish_reminders,),
+                     name='reminder-delivery', daemon=True).start()
+
+    while True:
+        time.sleep(REMINDER_POLL_INTERVAL)
+        try:
+            synced_at, schedule_updated_at = _poll_reminder_changes(synced_at, schedule_updated_at)
+        except Exception as e:
+            print(f"Reminder poll error: {e}")
+        publish_reminders()
+
+try:
+    _reminder_tz = ZoneInfo(REMINDER_TIMEZONE) if REMINDER_TIMEZONE else None
+except (ZoneInfoNotFoundError, ValueError):
+    print(f"Unknown REMINDER_TIMEZONE {REMINDER_TIMEZONE}, using server time")
+    _reminder_tz = None
+reminder_scheduler = ReminderScheduler(create_reminder_sink(), _reminder_tz)
+
+# Every worker imports this module, but only the one holding the lock fires reminders
+if db is not None and REMINDERS_ENABLED:
+    threading.Thread(target=_reminder_loop, name='reminders', daemon=True).start()
+
+@app.route('/api/reminders', methods=['GET'])
+def get_reminders():
+    limit = max(1, min(request.args.get('limit', 20, type=int), REMINDER_PUBLISH_LIMIT))
+    # Only the worker that owns the reminder engine holds pending reminders; it
+    # publishes them to Firestore after every poll and delivery
+    doc = db.collection('settings').document('reminders').get()
+    status = doc.to_dict() if doc.exists else {}
+    return jsonify({
+        'owner_pid': status.get('owner_pid'),
+        'updated_at': status.get('updated_at'),
+        'upcoming': status.get('upcoming', [])[:limit],
+        'delivered': status.get('delivered', [])[-limit:]
+    })
+
 @app.route('/api/settings', methods=['GET', 'POST'])
 def manage_settings():
     doc_ref = db.collection('settings').document('general')
@@ -777,10 +2296,18 @@ def get_google_fonts():
 @app.route('/api/remove-background', methods=['POST'])
 def remove_background():
     """Remove background from uploaded image using Remove.bg API"""
-    data = request.json
-    image_data = data.get('image')
+    # Multipart uploads stream their spooled file to Remove.bg without a base64 round trip
+    upload = None
+    image_data = None
+    if is_multipart_request():
+        upload = request.files.get('image')
+        if upload:
+            validate_image_upload(upload)
+    else:
+        data = request.json
+        image_data = data.get('image')
     
-    if not image_data:
+    if not image_data and not upload:
         return jsonify({'error': 'No image data provided'}), 400
     
     try:
@@ -789,20 +2316,23 @@ def remove_background():
         if not remove_bg_api_key:
             # Return original image if no API key
             return jsonify({
-                'image': image_data, 
+                'image': upload_to_data_url(upload) if upload else image_data, 
                 'message': 'Remove.bg API key not configured. Background removal disabled.'
             })
         
-        # Convert base64 to bytes
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
+        if upload:
+            image_file = (upload.filename or 'image', upload.stream, upload.mimetype)
+        else:
+            # Convert base64 to bytes
+            if image_data.startswith('data:image'):
+                image_data = image_data.split(',')[1]
+            
+            image_file = base64.b64decode(image_data)
         
         # Call Remove.bg API
         response = requests.post(
             'https://api.remove.bg/v1.0/removebg',
-            files={'image_file': image_bytes},
+            files={'image_file': image_file},
             data={'size': 'auto'},
             headers={'X-Api-Key': remove_bg_api_key},
             timeout=30
@@ -818,14 +2348,14 @@ def remove_background():
         else:
             print(f"Remove.bg API error: {response.status_code} - {response.text}")
             return jsonify({
-                'image': f'data:image/png;base64,{image_data}',
+                'image': upload_to_data_url(upload) if upload else f'data:image/png;base64,{image_data}',
                 'error': f'Background removal failed: {response.text}'
             }), response.status_code
             
     except Exception as e:
         print(f"Background removal error: {e}")
         return jsonify({
-            'image': f'data:image/png;base64,{image_data}',
+            'image': upload_to_data_url(upload) if upload else f'data:image/png;base64,{image_data}',
             'error': f'Background removal failed: {str(e)}'
         }), 500
 